@@ -0,0 +1,24 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+import numpy as np
+
+
+__all__ = ["ScratchBuffers"]
+
+
+class ScratchBuffers:
+    """Named scratch arrays, reused while the shape and dtype match."""
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name: str, shape: tuple[int, ...], dtype) -> np.ndarray:
+        """
+        Return the array stored under name, reallocated when the shape or
+        dtype changed. Its contents are left over from earlier calls.
+        """
+
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buf
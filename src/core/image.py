@@ -1,5 +1,6 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -8,6 +9,8 @@ import numpy as np
 
 from constants import Globals, Defaults
 
+from .parallel import thread_count
+
 
 @dataclass
 class Separation:
@@ -61,16 +64,19 @@ class ImageManager:
         output_dir = self.folder / output_folder
         output_dir.mkdir(parents=True, exist_ok=True)
 
+        # Collect the writes first, then encode them in parallel
+        jobs = []
+        use_subfolders = splits and halftones
         for separation in self.separations:
-            use_subfolders = splits and halftones
-
             if splits:
                 split_dir = output_dir / "splits" if use_subfolders else output_dir
                 split_dir.mkdir(parents=True, exist_ok=True)
-                Image.fromarray(separation.split).convert("L").save(
-                    split_dir / f"{separation.name}.{fmt}",
-                    dpi=(dpi, dpi),
-                    **dict(options["L"].items()),
+                jobs.append(
+                    (
+                        Image.fromarray(separation.split).convert("L"),
+                        split_dir / f"{separation.name}.{fmt}",
+                        options["L"],
+                    )
                 )
 
             if halftones:
@@ -78,16 +84,28 @@ class ImageManager:
                     output_dir / "halftones" if use_subfolders else output_dir
                 )
                 halftone_dir.mkdir(parents=True, exist_ok=True)
-                Image.fromarray(separation.halftone).convert("1").save(
-                    halftone_dir / f"{separation.name}.{fmt}",
-                    dpi=(dpi, dpi),
-                    **dict(options["1"].items()),
+                jobs.append(
+                    (
+                        Image.fromarray(separation.halftone).convert("1"),
+                        halftone_dir / f"{separation.name}.{fmt}",
+                        options["1"],
+                    )
                 )
         if preview:
-            self.preview.save(
-                output_dir / f"preview.{fmt}",
-                dpi=(dpi, dpi),
-                **dict(options["L"].items()),
-            )
+            jobs.append((self.preview, output_dir / f"preview.{fmt}", options["L"]))
+
+        # Pillow releases the GIL while encoding and compressing
+        def save_one(job):
+            image, path, format_options = job
+            image.save(path, dpi=(dpi, dpi), **dict(format_options.items()))
+
+        workers = min(8, len(jobs), thread_count())
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(save_one, job) for job in jobs]:
+                    future.result()
+        else:
+            for job in jobs:
+                save_one(job)
 
         print(f"Saved separations to {output_dir}")
@@ -0,0 +1,21 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+import logging
+
+
+__all__ = ["njit"]
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    from numba import njit
+except ImportError:
+    logger.debug("Numba not installed, kernels will run as plain Python")
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function unchanged."""
+
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
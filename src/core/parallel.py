@@ -0,0 +1,23 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+import os
+
+
+__all__ = ["thread_count", "set_thread_count"]
+
+_settings = {"threads": os.cpu_count() or 1}
+
+
+def thread_count() -> int:
+    """Return how many threads one image may use for its inner work."""
+
+    return _settings["threads"]
+
+
+def set_thread_count(count: int) -> None:
+    """
+    Limit the inner thread pools, e.g. to 1 in worker processes that
+    already separate several images in parallel.
+    """
+
+    _settings["threads"] = max(1, count)
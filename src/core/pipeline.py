@@ -6,6 +6,9 @@ import numpy as np
 from .template import TemplateManager
 from .image import ImageManager, Separation
 
+# Above this many separations the 2**n color table outgrows the image
+_PREVIEW_LUT_MAX_SEPARATIONS = 16
+
 
 class Pipeline:
     """Image separation and preview generation pipeline."""
@@ -74,25 +77,36 @@ class Pipeline:
             return
 
         try:
-            height, width = self.image.separations[0].halftone.shape
-            image_array = (
-                np.full(
-                    (height, width, 3),
-                    self.template.split_spec.substrate,
-                    dtype=np.float32,
-                )
-                / 255.0
-            )
-            for separation in self.image.separations:
-                halftone = separation.halftone.astype(np.float32)
-                mask = 1.0 - (halftone / 255.0)
-                mask = mask[..., np.newaxis]
+            separations = self.image.separations
+            height, width = separations[0].halftone.shape
+            substrate = np.array(self.template.split_spec.substrate, dtype=np.float32)
+
+            # A pixel's color only depends on which separations ink it, so
+            # compose every combination once and gather the pixels from it
+            use_lut = len(separations) <= _PREVIEW_LUT_MAX_SEPARATIONS
+            if use_lut:
+                combos = np.arange(1 << len(separations))
+                image_array = np.empty((len(combos), 3), dtype=np.float32)
+                codes = np.zeros((height, width), dtype=np.uint16)
+            else:
+                image_array = np.empty((height, width, 3), dtype=np.float32)
+            image_array[:] = substrate / 255.0
+
+            for i, separation in enumerate(separations):
+                # Halftones are binary, dark pixels carry the ink
+                ink = separation.halftone < 128
 
                 tone = np.array(separation.tone, dtype=np.float32) / 255.0
 
-                image_array = image_array * (1 - mask * (1 - tone))
-                self.image.preview = Image.fromarray(
-                    np.clip(image_array * 255, 0, 255).astype(np.uint8)
-                )
+                if use_lut:
+                    codes[ink] |= 1 << i
+                    image_array[(combos >> i) & 1 == 1] *= tone
+                else:
+                    image_array[ink] *= tone
+
+            image_array = np.clip(image_array * 255, 0, 255).astype(np.uint8)
+            self.image.preview = Image.fromarray(
+                image_array[codes] if use_lut else image_array
+            )
         except Exception as e:
             raise RuntimeError(f"Pipeline preview generation failed: {e}") from e
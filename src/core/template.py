@@ -1,5 +1,6 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+import functools
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
 import yaml
@@ -10,6 +11,74 @@ from modules import SplitSpec, SplitBase, ScreenSpec, ScreenBase, DotSpec, DotBa
 from .registry import MODULE_REGISTRY
 
 
+# mtime_ns is only part of the cache key, a changed file gets a new entry
+@functools.lru_cache(maxsize=16)
+def _read_yaml(path: str, mtime_ns: int) -> dict:  # pylint: disable=unused-argument
+    """
+    Parse a YAML template. Cached per path and modification time, so a
+    batch sharing one template parses it once and edits are picked up.
+    The result is shared, callers must not modify it.
+    """
+
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _sequence_type(seq) -> type:
+    """Return the plain sequence type to rebuild seq with."""
+
+    return list if isinstance(seq, list) else tuple
+
+
+def _convert_tree(obj, source: type, target: type):
+    """
+    Return a copy of nested dicts, lists and tuples with every `source`
+    sequence turned into `target`, other containers keep their type.
+    Walks with an explicit stack, so deeply nested data cannot hit the
+    recursion limit.
+    """
+
+    containers = (dict, list, tuple)
+    if not isinstance(obj, containers):
+        return obj
+
+    # Collect containers parents first, then rebuild them children first
+    order = []
+    flat = set()
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        children = node.values() if isinstance(node, dict) else node
+        nested = [child for child in children if isinstance(child, containers)]
+        if nested:
+            stack.extend(nested)
+        else:
+            flat.add(id(node))
+
+    converted = {}
+    for node in reversed(order):
+        if isinstance(node, dict):
+            if id(node) in flat:
+                # Only scalars inside, copy without per-item lookups
+                converted[id(node)] = dict(node)
+            else:
+                converted[id(node)] = {
+                    key: converted.get(id(value), value)
+                    for key, value in node.items()
+                }
+            continue
+
+        seq_type = target if isinstance(node, source) else _sequence_type(node)
+        if id(node) in flat:
+            converted[id(node)] = seq_type(node)
+        else:
+            converted[id(node)] = seq_type(
+                converted.get(id(item), item) for item in node
+            )
+    return converted[id(obj)]
+
+
 @dataclass
 class TemplateManager:
     """Manages split, screen, and dot template specifications."""
@@ -27,9 +96,7 @@ class TemplateManager:
 
         if not path.exists():
             raise FileNotFoundError(f"Template file not found: {path}")
-        with path.open("r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-        self._from_dict(data)
+        self._from_dict(_read_yaml(str(path), path.stat().st_mtime_ns))
         print(f"Loaded template from {path}")
 
     def save_yaml(self, path: Path):
@@ -51,7 +118,8 @@ class TemplateManager:
         def serialize(spec_obj, type_cls):
             if spec_obj is None or type_cls is None:
                 return None
-            data = asdict(spec_obj)
+            # Plain lists keep the YAML free of python/tuple tags
+            data = _convert_tree(asdict(spec_obj), tuple, list)
             data["type"] = type_cls.__name__
             return data
 
@@ -67,6 +135,9 @@ class TemplateManager:
         def parse_section(section_data, spec_cls):
             if not section_data:
                 return spec_cls(), None
+            # Converting copies the section, the popped type never
+            # reaches the caller's (possibly cached) data
+            section_data = _convert_tree(section_data, list, tuple)
             type_name = section_data.pop("type", None)
             type_cls = MODULE_REGISTRY.get(type_name) if type_name else None
             spec = spec_cls(**section_data)
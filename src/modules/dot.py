@@ -2,15 +2,22 @@
 
 import math
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 import numpy as np
 import cairo
+from PIL import Image
 
+from core.parallel import thread_count
 from core.registry import MODULE_REGISTRY
 
 from .screen import ScreenSpec
 
+# Cubic fill ramp of the concentric dot, sampled as gradient color stops
+_CONCENTRIC_STOPS = tuple((i / 16, (i / 16) ** 3) for i in range(17))
+_SQUARE_CORNERS = np.array([(-1, -1), (1, -1), (1, 1), (-1, 1)], dtype=float)
+
 
 @dataclass
 class DotSpec:
@@ -25,6 +32,19 @@ class DotBase(ABC):
         self.screen_spec = screen_spec
         self.spacing = screen_spec.ppi / screen_spec.lpi
         self.scale = screen_spec.dpi / screen_spec.ppi
+        self._stamps = {}
+
+        # Resolve the per-mode code paths once rather than per dot
+        self._radius_scale = (1 - spec.gain) / 2
+        self._half_size_lut = self._return_half_size(
+            self.spacing * self.scale, np.arange(256) / 255
+        )
+        if spec.size == "radius":
+            self._draw_dots = self._draw_filled
+        elif spec.size == "hardmix":
+            self._draw_dots = self._draw_stamped
+        else:
+            raise ValueError(f"Unknown dot size mode: '{spec.size}'")
 
     def render(
         self,
@@ -38,55 +58,130 @@ class DotBase(ABC):
         base_image = self._resize(base_image)
         height, width = base_image.shape
 
-        # Create Cairo image surface
-        surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
-        ctx = cairo.Context(surface)
-
-        # Fill background white
-        ctx.set_source_rgb(1, 1, 1)
-        ctx.paint()
+        # White canvas in Cairo's RGB24 layout, shared by all bands
+        stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_RGB24, width)
+        canvas = np.full((height, stride), 255, dtype=np.uint8)
 
         # Unpack vectorially
         x_coords = intensity_flow_array[:, 0] * self.scale
         y_coords = intensity_flow_array[:, 1] * self.scale
         intensities = intensity_flow_array[:, 2]
         angles_deg = intensity_flow_array[:, 3]
+        dots = (x_coords, y_coords, intensities, angles_deg)
 
-        # Draw dots
-        for x, y, intensity, angle in zip(x_coords, y_coords, intensities, angles_deg):
-            self._draw(
-                ctx=ctx,
-                center=(x, y),
-                size=self.spacing * self.scale,
-                angle=angle,
-                intensity=intensity,
-            )
-
-        # Convert Cairo RGB surface to NumPy grayscale
-        buf = surface.get_data()
-        screen_image = np.frombuffer(buf, dtype=np.uint8).reshape((height, width, 4))
-        screen_gray = screen_image[:, :, 0]
-
+        # The band threads share the stamp cache, fill it before they start
+        if self.spec.size == "hardmix":
+            size = self.spacing * self.scale
+            for angle in np.unique(np.rint(angles_deg)).tolist():
+                self._concentric_stamp(size, angle)
+
+        # Draw dots in horizontal bands on worker threads. Cairo releases
+        # the GIL while filling, so only rasterization overlaps across
+        # bands; tracing the dot paths in Python still holds the GIL.
+        band_height = math.ceil(height / min(thread_count(), height))
+        bands = [
+            (top, min(top + band_height, height))
+            for top in range(0, height, band_height)
+        ]
+        if len(bands) == 1:
+            self._render_band(canvas, width, bands[0], dots)
+        else:
+            with ThreadPoolExecutor(max_workers=len(bands)) as executor:
+                futures = [
+                    executor.submit(self._render_band, canvas, width, band, dots)
+                    for band in bands
+                ]
+                for future in futures:
+                    future.result()
+
+        # Every color byte of an RGB24 pixel holds the gray level
+        screen_gray = canvas.reshape((height, stride // 4, 4))[:, :width, 0]
+
+        # Both branches return a new array, so the halftone does not keep
+        # the whole canvas alive
         if self.spec.size == "hardmix":
             screen_gray = self._hardmix(base_image, screen_gray)
+        else:
+            screen_gray = np.ascontiguousarray(screen_gray)
 
         return screen_gray
 
+    def _render_band(
+        self,
+        canvas: np.ndarray,
+        width: int,
+        band: tuple[int, int],
+        dots: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+    ):
+        """Draw the dots reaching into rows [top, bottom) of the canvas."""
+
+        top, bottom = band
+        surface = cairo.ImageSurface.create_for_data(
+            canvas[top:bottom], cairo.FORMAT_RGB24, width, bottom - top, canvas.shape[1]
+        )
+        ctx = cairo.Context(surface)
+        ctx.translate(0, -top)
+
+        # Halftones end up as 1-bit images, so skip edge coverage work
+        ctx.set_antialias(cairo.ANTIALIAS_NONE)
+
+        # Dots centered just outside the band can still overlap it
+        reach = self.spacing * self.scale + 2
+        ys = dots[1]
+        selected = (ys >= top - reach) & (ys < bottom + reach)
+        self._draw_dots(ctx, *(column[selected] for column in dots))
+        surface.flush()
+
+    def _draw_filled(
+        self,
+        ctx: cairo.Context,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        intensities: np.ndarray,
+        angles: np.ndarray,
+    ):
+        """Draw intensity-sized dots, tracing them all and filling once."""
+
+        ctx.set_source_rgb(0, 0, 0)
+
+        # Quantize intensities to 8 bits and look the dot sizes up
+        levels = np.rint(intensities * 255).astype(np.uint8)
+        halves = self._half_size_lut.take(levels)
+
+        # Zero-sized dots add nothing to the path, drop them up front
+        keep = halves > 0
+        self._trace_shapes(ctx, xs[keep], ys[keep], halves[keep], angles[keep])
+        ctx.fill()
+
+    def _draw_stamped(
+        self,
+        ctx: cairo.Context,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        # Same signature as _draw_filled, stamped dots are always full size
+        intensities: np.ndarray,  # pylint: disable=unused-argument
+        angles: np.ndarray,
+    ):
+        """Paint full-size concentric dots from the cached stamps."""
+
+        size = self.spacing * self.scale
+        for x, y, angle in zip(xs.tolist(), ys.tolist(), angles.tolist()):
+            stamp = self._concentric_stamp(size, angle)
+            extent = stamp.get_width()
+            left = round(x - extent / 2)
+            top = round(y - extent / 2)
+            ctx.set_source_surface(stamp, left, top)
+            ctx.rectangle(left, top, extent, extent)
+            ctx.fill()
+
     def _hardmix(self, base_image: np.ndarray, screen_gray: np.ndarray) -> np.ndarray:
         """
         Apply hardmix blending of the halftone over the base grayscale image.
         """
 
-        # Invert the base image
-        inverted_base = 255 - base_image.astype(int)
-
-        # Combine with the halftone
-        combined = inverted_base + screen_gray.astype(int)
-
-        # Apply hardmix threshold
-        result = np.where(combined < 255, 0, 255).astype(np.uint8)
-
-        return result
+        # (255 - base) + screen >= 255 reduces to screen >= base, which
+        # compares the uint8 inputs directly without widening them
+        return np.where(screen_gray >= base_image, np.uint8(255), np.uint8(0))
 
     def _resize(self, image: np.ndarray) -> np.ndarray:
         """Resize the NumPy image array to match the screen DPI (nearest-neighbor)."""
@@ -94,27 +189,13 @@ class DotBase(ABC):
         if self.screen_spec.ppi != self.screen_spec.dpi:
             new_height = max(1, int(image.shape[0] * self.scale))
             new_width = max(1, int(image.shape[1] * self.scale))
-            # Nearest-neighbor resizing
-            y_indices = (np.arange(new_height) / self.scale).astype(int)
-            x_indices = (np.arange(new_width) / self.scale).astype(int)
-            resized = image[y_indices[:, None], x_indices]
-            return resized
+            # Nearest-neighbor resizing in Pillow's C resampler
+            resized = Image.fromarray(image).resize(
+                (new_width, new_height), Image.Resampling.NEAREST
+            )
+            return np.asarray(resized)
         return image
 
-    def _draw(
-        self,
-        ctx: cairo.Context,
-        *,
-        center: tuple[float, float],
-        size: float,
-        angle: float,
-        intensity: float,
-    ):
-        if self.spec.size == "hardmix":
-            self._draw_concentric(ctx, center, size, angle, intensity)
-        if self.spec.size == "radius":
-            self._draw_shape(ctx, center, size, angle, intensity)
-
     def _draw_concentric(
         self,
         ctx: cairo.Context,
@@ -128,13 +209,32 @@ class DotBase(ABC):
             t = (r / radius) ** 3
             self._draw_shape(ctx, center, r * 2, angle, intensity, fill=int(255 * t))
 
-    def _return_half_size(self, size: float, intensity: float) -> float:
-        if not self.spec.size == "radius":
-            intensity = 1.0
-        adjusted_radius = ((size * intensity) / 2) * (1 - self.spec.gain)
-        return max(adjusted_radius, 0.0)
+    def _concentric_stamp(self, size: float, angle: float) -> cairo.ImageSurface:
+        """
+        Return the concentric dot pre-rendered on a transparent surface.
+        Hardmix dots only differ by angle, so stamps are cached per degree.
+        """
+
+        key = self._stamp_key(angle)
+        stamp = self._stamps.get(key)
+        if stamp is None:
+            extent = math.ceil(size * math.sqrt(2)) + 2
+            stamp = cairo.ImageSurface(cairo.FORMAT_ARGB32, extent, extent)
+            stamp_ctx = cairo.Context(stamp)
+            stamp_ctx.set_antialias(cairo.ANTIALIAS_NONE)
+            center = (extent / 2, extent / 2)
+            self._draw_concentric(stamp_ctx, center, size, key, 1.0)
+            self._stamps[key] = stamp
+        return stamp
+
+    def _stamp_key(self, angle: float) -> int:
+        """Quantize a dot angle to the stamp it is drawn with."""
+        return round(angle) % 360
+
+    def _return_half_size(self, size: float, intensity: float | np.ndarray):
+        # Hardmix stamps are always drawn at full intensity by their callers
+        return np.maximum(size * intensity * self._radius_scale, 0.0)
 
-    @abstractmethod
     def _draw_shape(
         self,
         ctx: cairo.Context,
@@ -144,53 +244,153 @@ class DotBase(ABC):
         intensity: float,
         fill: int = 0,
     ):
-        pass
+        # Normalize fill to [0,1] for Cairo
+        fill_normalized = fill / 255
+        ctx.set_source_rgb(fill_normalized, fill_normalized, fill_normalized)
+        self._trace_shape(ctx, center, self._return_half_size(size, intensity), angle)
+        ctx.fill()
+
+    def _trace_shapes(
+        self,
+        ctx: cairo.Context,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        halves: np.ndarray,
+        angles: np.ndarray,
+    ):
+        """Append the outlines of many dots to the current path."""
+
+        for x, y, half, angle in zip(
+            xs.tolist(), ys.tolist(), halves.tolist(), angles.tolist()
+        ):
+            self._trace_shape(ctx, (x, y), half, angle)
+
+    @abstractmethod
+    def _trace_shape(
+        self,
+        ctx: cairo.Context,
+        center: tuple[float, float],
+        half: float,
+        angle: float,
+    ):
+        """Append the dot outline to the current path without filling it."""
 
 
 @MODULE_REGISTRY.register("round", "round dot", spec_cls=DotSpec)
 class RoundDot(DotBase):
     """Simple round dot."""
 
-    def _draw_shape(
+    def __init__(self, spec: DotSpec, screen_spec: ScreenSpec):
+        super().__init__(spec, screen_spec)
+        self._gradient = None
+
+    def _stamp_key(self, angle: float) -> int:
+        return 0
+
+    def _draw_concentric(
         self,
         ctx: cairo.Context,
         center: tuple[float, float],
         size: float,
         angle: float,
         intensity: float,
-        fill: int = 0,
     ):
+        """Fill the concentric rings in one go with a radial gradient."""
+
+        radius = self._return_half_size(size, intensity)
+        if self._gradient is None:
+            # Publish the gradient only once all its stops are added
+            gradient = cairo.RadialGradient(0, 0, 0, 0, 0, radius)
+            for offset, fill in _CONCENTRIC_STOPS:
+                gradient.add_color_stop_rgb(offset, fill, fill, fill)
+            self._gradient = gradient
+
         cx, cy = center
-        r = self._return_half_size(size, intensity)
-        # Normalize fill to [0,1] for Cairo
-        fill_normalized = fill / 255
-        ctx.set_source_rgb(fill_normalized, fill_normalized, fill_normalized)
-        ctx.arc(cx, cy, r, 0, 2 * math.pi)
+        ctx.save()
+        ctx.translate(cx, cy)
+        ctx.set_source(self._gradient)
+        ctx.arc(0, 0, radius, 0, math.tau)
         ctx.fill()
+        ctx.restore()
+
+    def _trace_shape(
+        self,
+        ctx: cairo.Context,
+        center: tuple[float, float],
+        half: float,
+        angle: float,
+    ):
+        cx, cy = center
+        ctx.new_sub_path()
+        ctx.arc(cx, cy, half, 0, math.tau)
+
+    def _trace_shapes(
+        self,
+        ctx: cairo.Context,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        halves: np.ndarray,
+        angles: np.ndarray,
+    ):
+        """Trace all circles in a tight loop, angles do not matter here."""
+
+        new_sub_path = ctx.new_sub_path
+        arc = ctx.arc
+        tau = math.tau
+        for cx, cy, half in zip(xs.tolist(), ys.tolist(), halves.tolist()):
+            new_sub_path()
+            arc(cx, cy, half, 0, tau)
 
 
 @MODULE_REGISTRY.register("square", "square dot", spec_cls=DotSpec)
 class SquareDot(DotBase):
     """Simple square dot."""
 
-    def _draw_shape(
+    def _stamp_key(self, angle: float) -> int:
+        return round(angle) % 90
+
+    def _trace_shape(
         self,
         ctx: cairo.Context,
         center: tuple[float, float],
-        size: float,
+        half: float,
         angle: float,
-        intensity: float,
-        fill: int = 0,
     ):
         cx, cy = center
-        half = self._return_half_size(size, intensity)
-        fill_normalized = fill / 255
-        ctx.set_source_rgb(fill_normalized, fill_normalized, fill_normalized)
 
-        # Save context for rotation
+        # Save context for rotation, the path itself is kept on restore
         ctx.save()
         ctx.translate(cx, cy)
         ctx.rotate(math.radians(angle))
         ctx.rectangle(-half, -half, half * 2, half * 2)
-        ctx.fill()
         ctx.restore()
+
+    def _trace_shapes(
+        self,
+        ctx: cairo.Context,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        halves: np.ndarray,
+        angles: np.ndarray,
+    ):
+        """Rotate the corners of all squares at once, then trace them."""
+
+        theta = np.radians(angles)
+        cos_h = (np.cos(theta) * halves)[:, np.newaxis]
+        sin_h = (np.sin(theta) * halves)[:, np.newaxis]
+
+        # Unit square corners in the same order as ctx.rectangle()
+        ux = _SQUARE_CORNERS[:, 0]
+        uy = _SQUARE_CORNERS[:, 1]
+        px = xs[:, np.newaxis] + ux * cos_h - uy * sin_h
+        py = ys[:, np.newaxis] + ux * sin_h + uy * cos_h
+
+        move_to = ctx.move_to
+        line_to = ctx.line_to
+        close_path = ctx.close_path
+        for (x0, x1, x2, x3), (y0, y1, y2, y3) in zip(px.tolist(), py.tolist()):
+            move_to(x0, y0)
+            line_to(x1, y1)
+            line_to(x2, y2)
+            line_to(x3, y3)
+            close_path()
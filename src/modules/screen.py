@@ -1,20 +1,27 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+import functools
 import math
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Iterator
 
 import numpy as np
+from PIL import Image
 
+from core.jit import njit
+from core.buffers import ScratchBuffers
 from core.registry import MODULE_REGISTRY
 
 
+_INV_255 = 1 / 255
+
+
 @dataclass
 class ScreenSpec:
     lpi: int = 55
     dpi: int = 1200
     ppi: int | None = None
+    dither_resample: str = "box"
 
 
 class ScreenBase(ABC):
@@ -23,6 +30,7 @@ class ScreenBase(ABC):
     def __init__(self, spec: ScreenSpec):
         self.spec = spec
         self.spacing = spec.ppi / spec.lpi
+        self._scratch = ScratchBuffers()
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(spec={repr(self.spec)})"
@@ -32,61 +40,141 @@ class ScreenBase(ABC):
     ) -> np.ndarray:
         """
         Compute intensity and flow angles at sampled points.
-        Returns a single array of shape (num_points, 4):
+        Returns a single float32 array of shape (num_points, 4):
             [x, y, intensity, angle]
         """
 
         height, width = image_array.shape
-        data = []
+        xs, ys = self._grid_points(image_array, angle)
+
+        x0, y0, x1, y1 = self._get_clipped_bounds(xs, ys, width, height)
+        valid = (x1 - x0 >= 2) & (y1 - y0 >= 2)
+        xs, ys = xs[valid], ys[valid]
+        x0, y0, x1, y1 = x0[valid], y0[valid], x1[valid], y1[valid]
+
+        # Summed-area table, any block sum is then four lookups. Accumulate
+        # in place so no full-size temporaries are allocated.
+        sat = self._scratch.get("sat", (height + 1, width + 1), np.int64)
+        sat[0] = 0
+        sat[:, 0] = 0
+        np.cumsum(image_array, axis=0, dtype=np.int64, out=sat[1:, 1:])
+        np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+
+        def block_sums(bx0, by0, bx1, by1):
+            return sat[by1, bx1] - sat[by0, bx1] - sat[by1, bx0] + sat[by0, bx0]
+
+        # Intensity
+        avg = block_sums(x0, y0, x1, y1) / ((x1 - x0) * (y1 - y0))
+        # Block means of 8-bit pixels are already within [0, 255]
+        intensities = avg * _INV_255
+
+        # Gradient vector. Summed over a line a, np.gradient telescopes to
+        # (a[1] - 3 a[0] + 3 a[-1] - a[-2]) / 2, so the block sums only need
+        # the two outermost column and row strips on each side.
+        def columns(c):
+            return block_sums(c, y0, c + 1, y1)
+
+        def rows(r):
+            return block_sums(x0, r, x1, r + 1)
+
+        gx = columns(x0 + 1) - 3 * columns(x0) + 3 * columns(x1 - 1) - columns(x1 - 2)
+        gy = rows(y0 + 1) - 3 * rows(y0) + 3 * rows(y1 - 1) - rows(y1 - 2)
+
+        # Flow angle, the common 1 / (2 * area) factor does not change it
+        angles = np.degrees(np.arctan2(gy, gx))
+
+        return _flow_array(xs, ys, intensities, angles)
+
+    def _get_clipped_bounds(
+        self, xs: np.ndarray, ys: np.ndarray, width: int, height: int
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the pixel block bounds around each point, clipped to the image."""
+        half = self.spacing / 2
+        x0 = np.maximum(0, (xs - half).astype(int))
+        y0 = np.maximum(0, (ys - half).astype(int))
+        x1 = np.minimum(width, (xs + half).astype(int))
+        y1 = np.minimum(height, (ys + half).astype(int))
+        return x0, y0, x1, y1
 
-        for x, y in self._iter_grid_points(image_array, angle):
-            block = self._get_clipped_block(x, y, width, height, image_array)
-            if block is None or block.size == 0:
-                continue
+    @abstractmethod
+    def _grid_points(
+        self, image_array: np.ndarray, angle=0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return center positions for dot placement as x and y arrays."""
+        raise NotImplementedError
 
-            if block.shape[0] < 2 or block.shape[1] < 2:
-                continue
 
-            # Intensity
-            avg = np.mean(block)
-            intensity = max(0.0, min(1.0, float(avg) / 255.0))
+def _flow_array(*columns: np.ndarray) -> np.ndarray:
+    """Write per-point columns into one (num_points, len(columns)) float32 array."""
 
-            # Gradient vector
-            gy, gx = np.gradient(block.astype(float))
-            gx_mean = np.mean(gx)
-            gy_mean = np.mean(gy)
+    result = np.empty((len(columns[0]), len(columns)), dtype=np.float32)
+    for i, column in enumerate(columns):
+        result[:, i] = column
+    return result
 
-            # Flow angle
-            angle = np.degrees(np.arctan2(gy_mean, gx_mean))
 
-            data.append([x, y, intensity, angle])
+@functools.lru_cache(maxsize=32)
+def _rotation(angle: float) -> tuple[float, float]:
+    """Return the cosine and sine of a screen angle in degrees."""
 
-        return np.array(data, dtype=float)
+    angle_rad = math.radians(angle)
+    return math.cos(angle_rad), math.sin(angle_rad)
 
-    def _get_clipped_block(
-        self, x: float, y: float, width: int, height: int, pixels: np.ndarray
-    ) -> np.ndarray | None:
-        """Return the pixel block centered at (x, y), clipped to image bounds."""
-        half = self.spacing / 2
-        x0, y0 = int(x - half), int(y - half)
-        x1, y1 = int(x + half), int(y + half)
 
-        x0_clip = max(0, x0)
-        y0_clip = max(0, y0)
-        x1_clip = min(width, x1)
-        y1_clip = min(height, y1)
+@functools.lru_cache(maxsize=32)
+def _am_grid(
+    spacing: float, angle: float, height: int, width: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the AM dot centers for an image size and screen angle.
+    The grid only depends on its arguments, so it is cached and shared
+    across separations and images of the same size.
+    """
 
-        if x0_clip >= x1_clip or y0_clip >= y1_clip:
-            return None
+    cos_a, sin_a = _rotation(angle)
 
-        return pixels[y0_clip:y1_clip, x0_clip:x1_clip]
+    cx, cy = width / 2, height / 2
 
-    @abstractmethod
-    def _iter_grid_points(
-        self, image_array: np.ndarray, angle=0
-    ) -> Iterator[tuple[float, float]]:
-        """Yield center positions for dot placement."""
-        raise NotImplementedError
+    # Rotated bounds of image
+    corners = [
+        (-cx, -cy),
+        (width - cx, -cy),
+        (-cx, height - cy),
+        (width - cx, height - cy),
+    ]
+
+    rotated_x = []
+    rotated_y = []
+    for x, y in corners:
+        rx = x * cos_a + y * sin_a
+        ry = -x * sin_a + y * cos_a
+        rotated_x.append(rx)
+        rotated_y.append(ry)
+
+    min_rx = min(rotated_x)
+    max_rx = max(rotated_x)
+    min_ry = min(rotated_y)
+    max_ry = max(rotated_y)
+
+    nx = int(math.ceil((max_rx - min_rx) / spacing))
+    ny = int(math.ceil((max_ry - min_ry) / spacing))
+
+    # Open grid, the rotation below broadcasts it to the full lattice
+    i, j = np.meshgrid(
+        np.arange(nx + 1), np.arange(ny + 1), indexing="ij", sparse=True
+    )
+    rx = min_rx + i * spacing
+    ry = min_ry + j * spacing
+
+    # Inverse rotation to image space
+    x = (rx * cos_a - ry * sin_a + cx).ravel()
+    y = (rx * sin_a + ry * cos_a + cy).ravel()
+
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    grid = x[inside], y[inside]
+    for arr in grid:
+        arr.setflags(write=False)
+    return grid
 
 
 @MODULE_REGISTRY.register(
@@ -95,54 +183,47 @@ class ScreenBase(ABC):
 class AMScreen(ScreenBase):
     """Uniform cell grid."""
 
-    def _iter_grid_points(
+    def _grid_points(
         self, image_array: np.ndarray, angle=0
-    ) -> Iterator[tuple[float, float]]:
+    ) -> tuple[np.ndarray, np.ndarray]:
         height, width = image_array.shape[:2]
-        angle_rad = math.radians(angle)
-        cos_a = math.cos(angle_rad)
-        sin_a = math.sin(angle_rad)
-
-        cx, cy = width / 2, height / 2
+        return _am_grid(self.spacing, angle, height, width)
 
-        # Rotated bounds of image
-        corners = [
-            (-cx, -cy),
-            (width - cx, -cy),
-            (-cx, height - cy),
-            (width - cx, height - cy),
-        ]
 
-        rotated_x = []
-        rotated_y = []
-        for x, y in corners:
-            rx = x * cos_a + y * sin_a
-            ry = -x * sin_a + y * cos_a
-            rotated_x.append(rx)
-            rotated_y.append(ry)
+# Fixed-point scale of the dither kernel, the 1/16 error weights become shifts
+_FS_SCALE = 16
+_FS_WHITE = 255 * _FS_SCALE
 
-        min_rx = min(rotated_x)
-        max_rx = max(rotated_x)
-        min_ry = min(rotated_y)
-        max_ry = max(rotated_y)
 
-        nx = int(math.ceil((max_rx - min_rx) / self.spacing))
-        ny = int(math.ceil((max_ry - min_ry) / self.spacing))
+@njit(cache=True)
+def _floyd_steinberg(arr: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """
+    Dither an integer array scaled to [0, _FS_WHITE] in place, writing the
+    resulting 0/1 map to out.
+    """
 
-        for i in range(nx + 1):
-            for j in range(ny + 1):
-                rx = min_rx + i * self.spacing
-                ry = min_ry + j * self.spacing
+    height, width = arr.shape
 
-                # Inverse rotation to image space
-                dx = rx * cos_a - ry * sin_a
-                dy = rx * sin_a + ry * cos_a
+    for y in range(height):
+        for x in range(width):
+            old_pixel = arr[y, x]
+            if 2 * old_pixel >= _FS_WHITE:
+                out[y, x] = 1
+                error = old_pixel - _FS_WHITE
+            else:
+                out[y, x] = 0
+                error = old_pixel
 
-                x = dx + cx
-                y = dy + cy
+            if x + 1 < width:
+                arr[y, x + 1] += (error * 7) >> 4
+            if x - 1 >= 0 and y + 1 < height:
+                arr[y + 1, x - 1] += (error * 3) >> 4
+            if y + 1 < height:
+                arr[y + 1, x] += (error * 5) >> 4
+            if x + 1 < width and y + 1 < height:
+                arr[y + 1, x + 1] += error >> 4
 
-                if 0 <= x < width and 0 <= y < height:
-                    yield x, y
+    return out
 
 
 @MODULE_REGISTRY.register(
@@ -151,73 +232,148 @@ class AMScreen(ScreenBase):
 class DitherScreen(ScreenBase):
     """Floyd-Steinberg dithered cell grid."""
 
-    def _iter_grid_points(
+    def compute_intensity_flow_array(
+        self, image_array: np.ndarray, angle: float = 0
+    ) -> np.ndarray:
+        """
+        Compute intensity and flow angles at the dithered dots.
+        Each dot takes the mean and gradient of the cell it was dithered
+        from, so no pixel blocks are summed a second time.
+        """
+
+        small, rows, cols, xs, ys = self._dots(image_array, angle)
+
+        intensities = small[rows, cols] * _INV_255
+
+        # Flow from the gradient between neighbouring cells
+        gx = np.zeros_like(small)
+        gy = np.zeros_like(small)
+        if small.shape[1] > 1:
+            gx = np.gradient(small, axis=1)
+        if small.shape[0] > 1:
+            gy = np.gradient(small, axis=0)
+        angles = np.degrees(np.arctan2(gy[rows, cols], gx[rows, cols]))
+
+        return _flow_array(xs, ys, intensities, angles)
+
+    def _grid_points(
         self, image_array: np.ndarray, angle=0
-    ) -> Iterator[tuple[float, float]]:
-        spacing = int(self.spacing)
+    ) -> tuple[np.ndarray, np.ndarray]:
+        _, _, _, xs, ys = self._dots(image_array, angle)
+        return xs, ys
+
+    def _dots(self, image_array: np.ndarray, angle=0) -> tuple[np.ndarray, ...]:
+        """
+        Dither the image, returning the cell grid, the rows and columns of
+        the dotted cells and their centers, limited to those inside the image.
+        """
+
         height, width = image_array.shape[:2]
-        theta = math.radians(angle)
+        small = self._cell_means(image_array)
+        rows, cols = self._dither(small)
+        xs, ys = self._cell_centers(rows, cols, (height, width), angle)
 
-        # Convert to grayscale if needed
-        if image_array.ndim == 3:
-            arr = np.mean(image_array, axis=2).astype(np.float32) / 255.0
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        return small, rows[inside], cols[inside], xs[inside], ys[inside]
+
+    def _cell_means(self, image_array: np.ndarray) -> np.ndarray:
+        """Downscale to the dot grid, returning one gray value per cell."""
+
+        spacing = int(self.spacing)
+
+        # Downscale to dot grid size first, so only sampled pixels get converted
+        if self.spec.dither_resample == "box":
+            # Average each cell, the dither only needs the cell mean
+            small = np.asarray(Image.fromarray(image_array).reduce(spacing))
+        elif self.spec.dither_resample == "nearest":
+            small = image_array[::spacing, ::spacing]
         else:
-            arr = image_array.astype(np.float32) / 255.0
+            raise ValueError(
+                f"Unknown dither resample filter: '{self.spec.dither_resample}'"
+            )
+
+        # Convert to grayscale if needed
+        if small.ndim == 3:
+            return np.mean(small, axis=2)
+        return small.astype(np.float64)
+
+    def _dither(self, small: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Dither the cell grid, returning the rows and columns that get a dot."""
+
+        # Contiguous integer buffers keep the compiled kernel on its fast path,
+        # the kernel writes every cell of out
+        arr = self._scratch.get("dither", small.shape, np.int32)
+        np.copyto(arr, small, casting="unsafe")
+        arr *= _FS_SCALE
+        out = self._scratch.get("dither_out", small.shape, np.uint8)
 
-        # Downscale to dot grid size
+        # Floyd-Steinberg dithering
+        _floyd_steinberg(arr, out)
+
+        return np.nonzero(out)
+
+    def _cell_centers(
+        self, rows: np.ndarray, cols: np.ndarray, shape: tuple[int, int], angle=0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Map cell indices to rotated dot centers in image space."""
+
+        spacing = int(self.spacing)
+        height, width = shape
         small_h = max(1, height // spacing)
         small_w = max(1, width // spacing)
-        small = arr[::spacing, ::spacing]
-        out = np.zeros_like(small)
 
-        # Floyd-Steinberg dithering
-        h_s, w_s = small.shape
-        for y in range(h_s):
-            for x in range(w_s):
-                old_pixel = small[y, x]
-                new_pixel = 1.0 if old_pixel >= 0.5 else 0.0
-                out[y, x] = new_pixel
-                error = old_pixel - new_pixel
-
-                if x + 1 < w_s:
-                    small[y, x + 1] += error * 7 / 16
-                if x - 1 >= 0 and y + 1 < h_s:
-                    small[y + 1, x - 1] += error * 3 / 16
-                if y + 1 < h_s:
-                    small[y + 1, x] += error * 5 / 16
-                if x + 1 < w_s and y + 1 < h_s:
-                    small[y + 1, x + 1] += error * 1 / 16
-
-        # Yield positions
-        cos_theta = math.cos(theta)
-        sin_theta = math.sin(theta)
+        cos_theta, sin_theta = _rotation(angle)
         cx, cy = width / 2, height / 2
         scx, scy = small_w / 2, small_h / 2
 
-        for j in range(h_s):
-            for i in range(w_s):
-                if out[j, i] >= 1.0:
-                    rx = (i + 0.5) * spacing
-                    ry = (j + 0.5) * spacing
+        # Cell indices map to image space through a single affine transform
+        # folding the cell size, the rotation and both centers together
+        ox = (0.5 - scx) * spacing
+        oy = (0.5 - scy) * spacing
+        a, b = spacing * cos_theta, spacing * sin_theta
+        tx = ox * cos_theta - oy * sin_theta + cx
+        ty = ox * sin_theta + oy * cos_theta + cy
+
+        xs = a * cols - b * rows + tx
+        ys = b * cols + a * rows + ty
+        return xs, ys
+
+
+def _bayer_thresholds(order: int) -> np.ndarray:
+    """Return a 2**order square Bayer matrix as 8-bit dither thresholds."""
+
+    matrix = np.zeros((1, 1))
+    for _ in range(order):
+        matrix = np.block(
+            [[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]]
+        )
+    return (matrix + 0.5) * (255 / matrix.size)
+
+
+_BAYER_8 = _bayer_thresholds(3)
+
 
-                    dx = rx - scx * spacing
-                    dy = ry - scy * spacing
+@MODULE_REGISTRY.register("ordered", "bayer", spec_cls=ScreenSpec)
+class OrderedDitherScreen(DitherScreen):
+    """Ordered (Bayer) dithered cell grid."""
 
-                    ox = dx * cos_theta - dy * sin_theta + cx
-                    oy = dx * sin_theta + dy * cos_theta + cy
+    def _dither(self, small: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Threshold cells against a tiled Bayer matrix, every cell is independent."""
 
-                    yield ox, oy
+        height, width = small.shape
+        size = len(_BAYER_8)
+        tiles = (-(-height // size), -(-width // size))
+        thresholds = np.tile(_BAYER_8, tiles)[:height, :width]
+        return np.nonzero(small >= thresholds)
 
 
 @MODULE_REGISTRY.register("threshold", spec_cls=ScreenSpec)
 class ThresholdScreen(ScreenBase):
     """Threshold-based screen."""
 
-    def _iter_grid_points(
+    def _grid_points(
         self, image_array: np.ndarray, angle=0
-    ) -> Iterator[tuple[float, float]]:
+    ) -> tuple[np.ndarray, np.ndarray]:
 
         ys, xs = np.nonzero(image_array > 127)
-        # Yield as floats
-        for x, y in zip(xs, ys):
-            yield float(x), float(y)
+        return xs.astype(float), ys.astype(float)
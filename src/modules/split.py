@@ -1,11 +1,13 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 
 import numpy as np
-from PIL import Image, ImageOps
+from PIL import Image
 
+from core.parallel import thread_count
 from core.registry import MODULE_REGISTRY
 
 
@@ -22,6 +24,7 @@ class SplitSpec:
     threshold: int = 30
     substrate: tuple[int, int, int] = (255, 255, 255)
     angles: tuple[int, ...] = (15, 75, 0, 45)
+    metric: str = "l2"
 
 
 @dataclass
@@ -49,6 +52,31 @@ class SpotSplitSpec(SplitSpec):
     pass
 
 
+# Below this many pixels, thread start-up costs more than the per-tone work
+_PARALLEL_MIN_PIXELS = 256 * 256
+
+# Largest RGB distance per metric, maps distances to [0, 1]
+_MAX_DISTANCE = {"l2": np.sqrt(3 * 255**2), "l1": 3 * 255, "linf": 255}
+
+
+def _color_distance(pixels: np.ndarray, color: np.ndarray, metric: str) -> np.ndarray:
+    """Per-pixel distance between uint8 (H, W, 3) pixels and a uint8 color."""
+
+    # Absolute difference without widening, max - min cannot wrap around
+    diff = np.maximum(pixels, color)
+    diff -= np.minimum(pixels, color)
+
+    if metric == "l2":
+        # Squares of 8-bit differences sum exactly in 32-bit integers
+        return np.sqrt(np.einsum("...c,...c->...", diff, diff, dtype=np.int32))
+    if metric == "l1":
+        # Stays in 16-bit lanes, 3 * 255 fits
+        return diff.sum(axis=2, dtype=np.int16)
+    if metric == "linf":
+        return diff.max(axis=2)
+    raise ValueError(f"Unknown color distance metric: '{metric}'")
+
+
 class SplitBase(ABC):
     def __init__(self, spec: SplitSpec):
         self.spec = spec
@@ -61,6 +89,50 @@ class SplitBase(ABC):
             image = image.convert(mode)
         return image
 
+    def _channel_planes(self, image: Image.Image) -> np.ndarray:
+        """Return the image channels as contiguous planes of one (C, H, W) array."""
+
+        return np.ascontiguousarray(np.moveaxis(np.asarray(image), -1, 0))
+
+    def _spec_colors(self) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        Return the spec tones as a uint8 (T, 3) array and the substrate
+        color or None. They are the same for every image, so subclasses
+        build them once.
+        """
+
+        tones = np.array(self.spec.tones, dtype=np.uint8).reshape((-1, 3))
+        substrate = None
+        if self.spec.substrate is not None:
+            substrate = np.array(self.spec.substrate, dtype=np.uint8)
+        return tones, substrate
+
+    def _map_tones(self, fn, *iterables, pixels: int) -> list:
+        """
+        Map fn over per-tone arguments like map(). NumPy releases the GIL
+        in its kernels, so large images are handled on worker threads.
+        """
+
+        workers = min(len(self.spec.tones), thread_count())
+        if workers <= 1 or pixels < _PARALLEL_MIN_PIXELS:
+            return list(map(fn, *iterables))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fn, *iterables))
+
+    def _tone_planes(self, fn, tone_args, size: tuple[int, int]) -> dict:
+        """
+        Call fn(tone_arg, plane) for every tone to fill its uint8 plane,
+        return the planes keyed by tone.
+        """
+
+        width, height = size
+        # Every tone writes its plane of one (C, H, W) tensor
+        planes = np.empty((len(tone_args), height, width), dtype=np.uint8)
+        self._map_tones(fn, tone_args, planes, pixels=height * width)
+
+        # Convert tone list to tuple so it’s hashable
+        return {tuple(tone): plane for tone, plane in zip(self.spec.tones, planes)}
+
     @abstractmethod
     def split(self, image: Image.Image):
         pass
@@ -73,13 +145,7 @@ class ProcessSplit(SplitBase):
 
         self.spec.tones = ((0, 255, 255), (255, 0, 255), (255, 255, 0), (0, 0, 0))
         image = self._ensure_mode(image, "CMYK")
-        c, m, y, k = image.split()
-        return {
-            "C": np.array(c, dtype=np.uint8),
-            "M": np.array(m, dtype=np.uint8),
-            "Y": np.array(y, dtype=np.uint8),
-            "K": np.array(k, dtype=np.uint8),
-        }
+        return dict(zip("CMYK", self._channel_planes(image)))
 
 
 @MODULE_REGISTRY.register("rgb", spec_cls=RGBSplitSpec)
@@ -89,12 +155,7 @@ class RGBSplit(SplitBase):
 
         self.spec.tones = ((255, 0, 0), (0, 255, 0), (0, 0, 255))
         image = self._ensure_mode(image, "RGB")
-        r, g, b = image.split()
-        return {
-            "R": np.array(r, dtype=np.uint8),
-            "G": np.array(g, dtype=np.uint8),
-            "B": np.array(b, dtype=np.uint8),
-        }
+        return dict(zip("RGB", self._channel_planes(image)))
 
 
 @MODULE_REGISTRY.register(
@@ -106,8 +167,8 @@ class LSplit(SplitBase):
 
         self.spec.tones = (0, 0, 0)
         image = self._ensure_mode(image, "L")
-        l = ImageOps.invert(image)
-        return {"L": np.array(l, dtype=np.uint8)}
+        # Invert while reading the pixels, one copy instead of two
+        return {"L": np.invert(np.asarray(image, dtype=np.uint8))}
 
 
 @MODULE_REGISTRY.register(
@@ -119,65 +180,92 @@ class LSplit(SplitBase):
     spec_cls=SimProcessSplitSpec,
 )
 class SimProcessSplit(SplitBase):
+    def __init__(self, spec: SimProcessSplitSpec):
+        super().__init__(spec)
+        if spec.metric not in _MAX_DISTANCE:
+            raise ValueError(f"Unknown color distance metric: '{spec.metric}'")
+        self._inv_norm = 1 / _MAX_DISTANCE[spec.metric]
+        # _color_distance takes the uint8 tones, the batched l2 path floats
+        self._tones_u8, self._substrate = self._spec_colors()
+        self._tones = self._tones_u8.astype(np.float32)
+        self._tones_sq = np.einsum("tc,tc->t", self._tones, self._tones)
+
     def split(self, image: Image.Image):
         """Simulate spot color separation using color distance,
         optionally accounting for a substrate color."""
 
         # Ensure image is RGB
         rgb_image = self._ensure_mode(image, "RGB")
-        img_array = np.array(rgb_image).astype(np.float32)  # shape: (H, W, 3)
+        img_array = np.asarray(rgb_image)
+        # The l2 distances come batched, other metrics are computed per tone
+        use_l2 = self.spec.metric == "l2"
+        tone_args = self._l2_distances(rgb_image) if use_l2 else self._tones_u8
 
         # Optional substrate
         substrate_mask = None
-        if self.spec.substrate is not None:
-            substrate_array = np.array(self.spec.substrate, dtype=np.float32).reshape(
-                (1, 1, 3)
+        if self._substrate is not None:
+            substrate_dist = _color_distance(
+                img_array, self._substrate, self.spec.metric
             )
-            substrate_dist = np.linalg.norm(img_array - substrate_array, axis=2)
-            substrate_mask = substrate_dist / np.sqrt(3 * (255**2))
-            substrate_mask = substrate_mask.clip(0, 1)
-
-        separations = {}
+            substrate_mask = (substrate_dist * self._inv_norm).clip(0, 1)
 
-        for tone in self.spec.tones:
-            tone_array = np.array(tone, dtype=np.float32).reshape((1, 1, 3))
-            tone_dist = np.linalg.norm(img_array - tone_array, axis=2)
-            tone_mask = (1 - tone_dist / np.sqrt(3 * (255**2))).clip(0, 1)
+        def tone_separation(tone_arg, plane):
+            tone_dist = tone_arg
+            if not use_l2:
+                tone_dist = _color_distance(img_array, tone_arg, self.spec.metric)
+            tone_mask = (1 - tone_dist * self._inv_norm).clip(0, 1)
 
             if substrate_mask is not None:
                 tone_mask *= substrate_mask
 
-            # Convert tone list to tuple so it’s hashable
-            separations[tuple(tone)] = (tone_mask * 255).astype(np.uint8)
+            np.multiply(tone_mask, 255, out=plane, casting="unsafe")
 
-        return separations
+        return self._tone_planes(tone_separation, tone_args, rgb_image.size)
+
+    def _l2_distances(self, rgb_image: Image.Image) -> np.ndarray:
+        """Euclidean distances from every pixel to every tone, (T, H, W)."""
+
+        width, height = rgb_image.size
+        img_array = np.asarray(rgb_image, dtype=np.float32)
+
+        # Squared distances to all tones at once, expanded as
+        # |p - t|^2 = |p|^2 - 2 p.t + |t|^2 so one matrix product does the work
+        pixels = img_array.reshape(-1, 3)
+        tone_d2 = np.empty((len(self._tones), height * width), dtype=np.float32)
+        np.matmul(self._tones, pixels.T, out=tone_d2)
+        tone_d2 *= -2
+        tone_d2 += np.einsum("nc,nc->n", pixels, pixels)
+        tone_d2 += self._tones_sq[:, np.newaxis]
+        np.maximum(tone_d2, 0, out=tone_d2)
+        return np.sqrt(tone_d2, out=tone_d2).reshape(-1, height, width)
 
 
 @MODULE_REGISTRY.register("spot", spec_cls=SpotSplitSpec)
 class SpotSplit(SplitBase):
+    def __init__(self, spec: SpotSplitSpec):
+        super().__init__(spec)
+        self._tones, self._substrate = self._spec_colors()
+
     def split(self, image: Image.Image):
         """Split image into spot color channels based on color similarity (within threshold),
         optionally avoiding substrate-colored regions."""
 
         rgb_image = self._ensure_mode(image, "RGB")
-        img_array = np.array(rgb_image).astype(np.int16)
+        img_array = np.asarray(rgb_image)
 
         substrate_dist = None
-        if self.spec.substrate is not None:
-            substrate_array = np.array(self.spec.substrate, dtype=np.int16).reshape(
-                (1, 1, 3)
+        if self._substrate is not None:
+            substrate_dist = _color_distance(
+                img_array, self._substrate, self.spec.metric
             )
-            substrate_dist = np.linalg.norm(img_array - substrate_array, axis=2)
 
-        separations = {}
-        for tone in self.spec.tones:
-            tone_array = np.array(tone, dtype=np.int16).reshape((1, 1, 3))
-            tone_dist = np.linalg.norm(img_array - tone_array, axis=2)
+        def tone_separation(tone_array, plane):
+            tone_dist = _color_distance(img_array, tone_array, self.spec.metric)
 
             mask = tone_dist <= self.spec.threshold
             if substrate_dist is not None:
                 mask &= substrate_dist > self.spec.threshold
 
-            separations[tuple(tone)] = mask.astype(np.uint8) * 255
+            np.multiply(mask, np.uint8(255), out=plane)
 
-        return separations
+        return self._tone_planes(tone_separation, self._tones, rgb_image.size)
@@ -1,17 +1,35 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
 import sys
-import argparse
 import logging
 
 from log import setup_logging
 from constants import Globals
 
-parser = argparse.ArgumentParser(add_help=False)
-parser.add_argument("-v", "--verbose", action="count", default=0)
-parser.add_argument("-q", "--quiet", action="store_true")
-early_args, _ = parser.parse_known_args()
-setup_logging(early_args.verbose, early_args.quiet)
+
+def _early_verbosity(argv: list[str]) -> tuple[int, bool]:
+    """
+    Scan for -v/--verbose and -q/--quiet before the full CLI parser runs.
+    Only the plain spellings are recognised, AppCLI re-applies the parsed
+    values once the full parser has run.
+    """
+
+    verbose, quiet = 0, False
+    for arg in argv:
+        if arg == "--":
+            break
+        if arg == "--verbose":
+            verbose += 1
+        elif arg == "--quiet":
+            quiet = True
+        elif arg[:1] == "-" and arg[1:2] != "-" and set(arg[1:]) <= {"v", "q"}:
+            # Bundled short flags such as -vv or -vq
+            verbose += arg.count("v")
+            quiet = quiet or "q" in arg
+    return verbose, quiet
+
+
+setup_logging(*_early_verbosity(sys.argv[1:]))
 logger = logging.getLogger(__name__)
 
 from ui import AppCLI, AppGUI  # pylint: disable=wrong-import-position
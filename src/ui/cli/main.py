@@ -1,80 +1,177 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
 import argparse
+import functools
+import glob
+import itertools
+import os
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import logging
-import glob
 
 from constants import Globals, Defaults
-from core import Seps
+from log import setup_logging
 
 
 logger = logging.getLogger(__name__)
 
+# Each worker holds a full-page canvas, so only a few files run at once
+_MAX_WORKERS = 4
 
-class AppCLI:
-    """Pyseps command-line interface."""
 
-    def __init__(self):
-        self.parser = argparse.ArgumentParser(description="pyseps CLI")
-        self._setup_arguments()
+def _iter_inputs(patterns: list[str]) -> Iterator[Path]:
+    """Yield input files as the patterns are expanded, warning on empty ones."""
 
-    def _setup_arguments(self):
-        self.parser.add_argument(
-            "files", nargs="+", help="Input file(s) or wildcard pattern(s)"
-        )
-        log_group = self.parser.add_argument_group(
-            "Logging Verbosity", "Set module chattiness"
-        )
-        log_group.add_argument(
-            "-v",
-            "--verbose",
-            action="count",
-            default=0,
-            help="Increase verbosity (-v for INFO, -vv for DEBUG)",
-        )
-        log_group.add_argument(
-            "-q", "--quiet", action="store_true", help="Suppress non-error output"
-        )
+    for pattern in patterns:
+        matched = False
+        for match in glob.iglob(pattern, recursive=True):
+            matched = True
+            yield Path(match)
+        if not matched:
+            logger.warning("No files matched pattern: %s", pattern)
 
-        opt_group = self.parser.add_argument_group(
-            "Optional Features", "Enable or disable extra features"
-        )
-        opt_group.add_argument("-t", "--template", help="Template file")
-        opt_group.add_argument(
-            "-o", "--output", default=Defaults.OUTPUT, help="Output folder"
-        )
-        opt_group.add_argument(
-            "-H",
-            "--halftones",
-            action="store_true",
-            default=Defaults.SAVE_HALFTONES,
-            help="Enable saving halftones",
-        )
-        opt_group.add_argument(
-            "-S",
-            "--splits",
-            action="store_true",
-            default=Defaults.SAVE_SPLITS,
-            help="Enable saving splits",
-        )
-        opt_group.add_argument(
-            "-P",
-            "--preview",
-            action="store_true",
-            default=Defaults.SAVE_PREVIEW,
-            help="Enable saving colorized preview",
-        )
-        opt_group.add_argument(
-            "-f",
-            "--format",
-            choices=list(Globals.IMAGE_FORMATS.keys()),
-            default="tiff",
-            help="Output file format",
+
+@functools.lru_cache(maxsize=64)
+def _find_template(folder: Path) -> Path | None:
+    """Return a YAML template next to the inputs, preferring .yaml over .yml."""
+
+    fallback = None
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(".yaml"):
+                return Path(entry.path)
+            if fallback is None and entry.name.endswith(".yml"):
+                fallback = entry.path
+    return Path(fallback) if fallback else None
+
+
+def _init_worker(verbose: int, quiet: bool) -> None:
+    """Set up a worker process, one thread each since the files run in parallel."""
+
+    # pylint: disable-next=import-outside-toplevel
+    from core.parallel import set_thread_count
+
+    setup_logging(verbose, quiet)
+    set_thread_count(1)
+
+
+def _process_one(input_file: Path, options: dict, output_folder: Path) -> None:
+    """Separate and save a single input file, logging any failure."""
+
+    # Deferred so --help and argument errors skip the NumPy/PIL imports
+    # pylint: disable-next=import-outside-toplevel
+    from core import Seps
+
+    logger.info("Processing file: %s", input_file)
+
+    seps = Seps()
+    try:
+        seps.load(input_file)
+    except Exception as e:
+        logger.error("Error loading %s: %s", input_file, e)
+        return
+
+    # Determine template
+    if options["template"]:
+        template = Path(options["template"])
+    else:
+        template = _find_template(input_file.parent) or Globals.TEMPLATE
+
+    logger.info("Using template: %s", template)
+
+    try:
+        seps.import_template(template)
+        seps.generate()
+        seps.save(
+            splits=options["splits"],
+            halftones=options["halftones"],
+            preview=options["preview"],
+            fmt=options["format"],
+            output_folder=output_folder,
         )
+        logger.info("Finished processing %s", input_file)
+    except Exception as e:
+        logger.error("Error processing %s: %s", input_file, e)
+
+
+def _process_group(jobs: list[tuple[Path, Path]], options: dict) -> None:
+    """Process inputs that share an output folder one after another."""
+
+    for input_file, output_folder in jobs:
+        _process_one(input_file, options, output_folder)
+
+
+@functools.cache
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the CLI argument parser once, it is shared by every AppCLI."""
+
+    parser = argparse.ArgumentParser(description="pyseps CLI")
+    parser.add_argument("files", nargs="+", help="Input file(s) or wildcard pattern(s)")
+    log_group = parser.add_argument_group("Logging Verbosity", "Set module chattiness")
+    log_group.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Increase verbosity (-v for INFO, -vv for DEBUG)",
+    )
+    log_group.add_argument(
+        "-q", "--quiet", action="store_true", help="Suppress non-error output"
+    )
+
+    opt_group = parser.add_argument_group(
+        "Optional Features", "Enable or disable extra features"
+    )
+    opt_group.add_argument("-t", "--template", help="Template file")
+    opt_group.add_argument(
+        "-o",
+        "--output",
+        default=Defaults.OUTPUT,
+        help="Output folder, with one subfolder per input when several are given",
+    )
+    opt_group.add_argument(
+        "-H",
+        "--halftones",
+        action="store_true",
+        default=Defaults.SAVE_HALFTONES,
+        help="Enable saving halftones",
+    )
+    opt_group.add_argument(
+        "-S",
+        "--splits",
+        action="store_true",
+        default=Defaults.SAVE_SPLITS,
+        help="Enable saving splits",
+    )
+    opt_group.add_argument(
+        "-P",
+        "--preview",
+        action="store_true",
+        default=Defaults.SAVE_PREVIEW,
+        help="Enable saving colorized preview",
+    )
+    opt_group.add_argument(
+        "-f",
+        "--format",
+        choices=list(Globals.IMAGE_FORMATS.keys()),
+        default="tiff",
+        help="Output file format",
+    )
+    return parser
+
+
+class AppCLI:
+    """Pyseps command-line interface."""
+
+    def __init__(self):
+        self.parser = _build_parser()
 
     def run(self):
         args = self.parser.parse_args()
+        # The early argv scan in pyseps.py misses abbreviated, --verbose=N
+        # and bundled spellings, the parsed values are authoritative
+        setup_logging(args.verbose, args.quiet)
         self.handle(args)
 
     def handle(self, args):
@@ -84,55 +181,49 @@ class AppCLI:
             )
             return
 
-        # Expand wildcards manually
-        expanded_files = []
-        for pattern in args.files:
-            matched = glob.glob(pattern, recursive=True)
-            if matched:
-                expanded_files.extend(matched)
-            else:
-                logger.warning("No files matched pattern: %s", pattern)
-
-        if not expanded_files:
+        # Expand wildcards lazily, so processing starts with the first match
+        inputs = _iter_inputs(args.files)
+        first = next(inputs, None)
+        if first is None:
             logger.error("No input files found.")
             return
 
-        # Process each file
-        for file_path in expanded_files:
-            input_file = Path(file_path).resolve()
-            logger.info("Processing file: %s", input_file)
-
-            seps = Seps()
-            try:
-                seps.load(input_file)
-            except Exception as e:
-                logger.error("Error loading %s: %s", input_file, e)
-                continue
-
-            # Determine template
-            if args.template:
-                template = Path(args.template)
-            else:
-                yaml_files = list(input_file.parent.glob("*.yaml")) + list(
-                    input_file.parent.glob("*.yml")
-                )
-                if yaml_files:
-                    template = yaml_files[0]
-                else:
-                    template = Globals.TEMPLATE
-
-            logger.info("Using template: %s", template)
-
-            try:
-                seps.import_template(template)
-                seps.generate()
-                seps.save(
-                    splits=args.splits,
-                    halftones=args.halftones,
-                    preview=args.preview,
-                    fmt=args.format,
-                    output_folder=Path(args.output),
-                )
-                logger.info("Finished processing %s", input_file)
-            except Exception as e:
-                logger.error("Error processing %s: %s", input_file, e)
+        options = {
+            "template": args.template,
+            "splits": args.splits,
+            "halftones": args.halftones,
+            "preview": args.preview,
+            "format": args.format,
+            "output": args.output,
+        }
+
+        second = next(inputs, None)
+        if second is None:
+            _process_one(first, options, Path(args.output))
+            return
+
+        # Every file of a batch saves to its own subfolder, so parallel
+        # workers do not overwrite each other's separations. Files whose
+        # folders still coincide (same stem) are handled by one worker in turn.
+        groups = {}
+        for input_file in itertools.chain((first, second), inputs):
+            output_folder = Path(args.output) / input_file.stem
+            key = (input_file.parent / output_folder).resolve()
+            groups.setdefault(key, []).append((input_file, output_folder))
+
+        # Files are independent and CPU bound, separate them in parallel
+        with ProcessPoolExecutor(
+            max_workers=min(len(groups), _MAX_WORKERS, os.cpu_count() or 1),
+            initializer=_init_worker,
+            initargs=(args.verbose, args.quiet),
+        ) as executor:
+            futures = {
+                executor.submit(_process_group, jobs, options): folder
+                for folder, jobs in groups.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                # One bad input, or a crashed worker, must not abort the batch
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    logger.error("Error processing into %s: %s", futures[future], e)